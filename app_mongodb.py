@@ -24,6 +24,10 @@ from bson import ObjectId
 # Import MongoDB configuration and models
 from mongodb_config import (
     init_mongodb, test_mongodb_connection, create_default_users, get_database_stats,
+    migrate_reminder_times, migrate_reminder_days, migrate_status_codes, setup_logging,
+    migrate_medication_logs, migrate_next_due, drop_legacy_indexes,
+    ProcessingStatus, get_user_fast,
+    medication_dict_from_raw, user_exists, email_exists,
     User, Medication, Reminder, MedicationLog, PrescriptionUpload
 )
 
@@ -32,6 +36,9 @@ from prescription_ocr import PrescriptionOCR
 from ai_processor import AIProcessor
 from medication_reminder import MedicationReminder
 
+# Route logging through the queued handler however the app is started
+setup_logging()
+
 # Flask app configuration
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here-change-in-production'
@@ -54,7 +61,7 @@ login_manager.login_view = 'login'
 def load_user(user_id):
     """Load user for Flask-Login"""
     try:
-        return User.objects(id=ObjectId(user_id)).first()
+        return get_user_fast(user_id)
     except:
         return None
 
@@ -129,20 +136,23 @@ def register():
             return jsonify({'success': False, 'message': 'All fields are required'}), 400
         
         # Check if user already exists
-        if User.objects(username=username).first():
+        if user_exists(username):
             return jsonify({'success': False, 'message': 'Username already exists'}), 409
         
-        if User.objects(email=email).first():
+        if email_exists(email):
             return jsonify({'success': False, 'message': 'Email already exists'}), 409
         
         # Create new user
         user = User(
             username=username,
-            email=email,
             first_name=data.get('first_name', ''),
             last_name=data.get('last_name', ''),
             is_active=True
         )
+        try:
+            user.set_email(email)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid email address'}), 400
         user.set_password(password)
         user.save()
         
@@ -230,14 +240,15 @@ def medications():
         try:
             print(f"Getting medications for user {current_user.id} ({current_user.username})")
             
+            # Read raw dicts to skip MongoEngine document instantiation
             medications = Medication.objects(
                 user_id=current_user.id,
                 is_active=True
-            ).order_by('-created_at')
+            ).order_by('-created_at').as_pymongo()
             
-            print(f"Found {len(medications)} medications for user {current_user.id}")
+            result = [medication_dict_from_raw(med) for med in medications]
             
-            result = [med.to_dict() for med in medications]
+            print(f"Found {len(result)} medications for user {current_user.id}")
             
             for med in result:
                 print(f"  - {med['name']}: {med['dosage']}, {med['frequency']}")
@@ -279,7 +290,7 @@ def upload_prescription():
                 file_path=filepath,
                 file_size=os.path.getsize(filepath),
                 mime_type=file.content_type,
-                processing_status='processing'
+                processing_status=ProcessingStatus.PROCESSING
             )
             upload_record.save()
             
@@ -330,7 +341,7 @@ def upload_prescription():
             upload_record.processing_time = processing_time
             upload_record.medications_found = len(medications)
             upload_record.medications_added = medications_added
-            upload_record.processing_status = 'completed'
+            upload_record.processing_status = ProcessingStatus.COMPLETED
             upload_record.processed_at = datetime.utcnow()
             upload_record.save()
             
@@ -348,7 +359,7 @@ def upload_prescription():
         
         # Update upload record with error
         if 'upload_record' in locals():
-            upload_record.processing_status = 'failed'
+            upload_record.processing_status = ProcessingStatus.FAILED
             upload_record.error_message = str(e)
             upload_record.save()
         
@@ -457,32 +468,18 @@ class MongoMedicationReminder:
         """Check for due reminders and send alerts"""
         try:
             current_time = datetime.now()
-            current_time_str = current_time.strftime('%H:%M')
-
-            # Get all active reminders
-            reminders = Reminder.objects(is_active=True)
 
-            for reminder in reminders:
-                if self._is_time_match(current_time_str, reminder.time):
-                    if not self._reminder_sent_recently(reminder):
-                        self._send_reminder_alert(reminder)
+            # Active reminders whose next_due has passed, earliest first (partial index range scan)
+            for reminder in Reminder.due_reminders(current_time):
+                # Schedule the next firing first, so a failed send is not retried every minute
+                reminder.next_due = reminder.compute_next_due(current_time)
+                reminder.save()
+                if not self._reminder_sent_recently(reminder):
+                    self._send_reminder_alert(reminder)
 
         except Exception as e:
             print(f"❌ Error checking reminders: {e}")
 
-    def _is_time_match(self, current_time, reminder_time):
-        """Check if current time matches reminder time (within 1 minute)"""
-        try:
-            current_hour, current_minute = map(int, current_time.split(':'))
-            reminder_hour, reminder_minute = map(int, reminder_time.split(':'))
-
-            current_total_minutes = current_hour * 60 + current_minute
-            reminder_total_minutes = reminder_hour * 60 + reminder_minute
-
-            return abs(current_total_minutes - reminder_total_minutes) <= 1
-        except:
-            return False
-
     def _reminder_sent_recently(self, reminder):
         """Check if reminder was sent recently (within last hour)"""
         if not reminder.last_sent:
@@ -551,6 +548,22 @@ def initialize_mongodb_app():
             print("❌ MongoDB initialization failed")
             return False
 
+        # Drop replaced indexes before anything creates the new ones
+        if not drop_legacy_indexes():
+            print("⚠️ Warning: Legacy indexes could not be dropped")
+
+        # Convert legacy reminder fields, schedule reminders, move legacy logs and convert statuses
+        if not migrate_reminder_times():
+            print("⚠️ Warning: Some reminder times could not be migrated")
+        if not migrate_reminder_days():
+            print("⚠️ Warning: Reminder days could not be migrated")
+        if not migrate_next_due():
+            print("⚠️ Warning: Some reminders could not be scheduled")
+        if not migrate_medication_logs():
+            print("⚠️ Warning: Legacy medication logs could not be moved")
+        if not migrate_status_codes():
+            print("⚠️ Warning: Status codes could not be migrated")
+
         # Create default users
         if not create_default_users():
             print("⚠️ Warning: Could not create default users")
@@ -3,16 +3,63 @@ MongoDB Configuration and Models for MEDIMORPH
 This module provides MongoDB integration using MongoEngine ODM
 """
 
-from mongoengine import Document, EmbeddedDocument, fields, connect, disconnect
+from mongoengine import Document, EmbeddedDocument, fields, signals, connect, disconnect
+from mongoengine.context_managers import no_dereference
+from mongoengine.errors import OperationError
+from mongoengine.queryset import QuerySet
 from flask_login import UserMixin
-from datetime import datetime, time
+from datetime import datetime, time, timedelta
+from enum import IntEnum
 from werkzeug.security import generate_password_hash, check_password_hash
+from concurrent.futures import ThreadPoolExecutor
+from bson import SON, ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+import asyncio
+import atexit
+import copy
+import functools
+import logging
+import logging.handlers
+import operator
 import os
+import queue
+import re
+
+logger = logging.getLogger(__name__)
+
+_log_listener = None
+
+def setup_logging(level=logging.INFO):
+    """Route root logging through a queue so callers never block on console I/O"""
+    global _log_listener
+    if _log_listener is not None:
+        return _log_listener
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(level)
+    _log_listener = logging.handlers.QueueListener(log_queue, logging.StreamHandler())
+    _log_listener.start()
+    atexit.register(_log_listener.stop)  # Flush queued records on exit
+    return _log_listener
 
 # MongoDB Configuration
 MONGODB_URI = "mongodb://localhost:27017/"
 DATABASE_NAME = "medimorph_db"
 
+# Checked once at signup instead of by EmailField on every load
+_EMAIL_RE = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+
+# Cached to skip the datetime attribute lookup in defaults and save()
+_utcnow = datetime.utcnow
+
+# Password hashing: scrypt (n=2**14, r=8, p=1) runs as a single OpenSSL call
+PASSWORD_HASH_METHOD = "scrypt:16384:8:1"
+PASSWORD_SALT_LENGTH = 16
+
 def init_mongodb(app=None):
     """Initialize MongoDB connection"""
     try:
@@ -26,15 +73,21 @@ def init_mongodb(app=None):
             serverSelectionTimeoutMS=5000,  # 5 second timeout
             connectTimeoutMS=10000,  # 10 second timeout
             socketTimeoutMS=20000,   # 20 second timeout
-            maxPoolSize=50,
+            maxPoolSize=200,
+            minPoolSize=10,          # Keep warm connections to avoid churn
+            maxIdleTimeMS=300000,    # Close connections idle for 5 minutes
+            compressors='zstd,zlib',  # Uses the first one supported by the server
+            zlibCompressionLevel=6,
+            w=1,
+            readPreference='primaryPreferred',
             retryWrites=True
         )
         
-        print(f"✅ Connected to MongoDB: {MONGODB_URI}{DATABASE_NAME}")
+        logger.info("✅ Connected to MongoDB: %s%s", MONGODB_URI, DATABASE_NAME)
         return True
         
     except Exception as e:
-        print(f"❌ MongoDB connection failed: {e}")
+        logger.error("❌ MongoDB connection failed: %s", e)
         return False
 
 def test_mongodb_connection():
@@ -49,20 +102,218 @@ def test_mongodb_connection():
         
         # List databases
         db_list = client.list_database_names()
-        print(f"📊 Available databases: {db_list}")
+        logger.info("📊 Available databases: %s", db_list)
         
         # Get database info
         db = client[DATABASE_NAME]
         collections = db.list_collection_names()
-        print(f"📁 Collections in {DATABASE_NAME}: {collections}")
+        logger.info("📁 Collections in %s: %s", DATABASE_NAME, collections)
         
         client.close()
         return True
         
     except Exception as e:
-        print(f"❌ MongoDB connection test failed: {e}")
+        logger.error("❌ MongoDB connection test failed: %s", e)
         return False
 
+# Serialization helpers
+
+def _isoformat(value):
+    """Return ISO string for a datetime, or None"""
+    return value.isoformat() if value else None
+
+def _str_id(value):
+    """Return ObjectId as string, or None"""
+    return str(value) if value else None
+
+def _format_minutes(minutes):
+    """Format minutes since midnight as "HH:MM", or None"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}" if minutes is not None else None
+
+def parse_time_minutes(value):
+    """Parse an "HH:MM" string into minutes since midnight"""
+    try:
+        hours, minutes = map(int, value.split(':'))
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time: {value!r}") from None
+    return hours * 60 + minutes
+
+# Day names indexed by datetime.weekday(); bit i of a days mask is DAY_NAMES[i]
+DAY_NAMES = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+ALL_DAYS_MASK = 0x7F
+
+def _days_from_mask(mask):
+    """Expand a days bitmask into a list of day names"""
+    return [name for bit, name in enumerate(DAY_NAMES) if mask & (1 << bit)]
+
+def next_due_after(time_minutes, days_mask, after):
+    """First local datetime after `after` at time_minutes on a day in days_mask, or None"""
+    midnight = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    # Eight days reaches the same weekday next week when today's slot has passed
+    for offset in range(8):
+        day = midnight + timedelta(days=offset)
+        due = day + timedelta(minutes=time_minutes)
+        if due > after and days_mask & (1 << day.weekday()):
+            return due
+    return None
+
+def days_to_mask(days):
+    """Pack a list of day names into a days bitmask; an empty list means every day"""
+    mask = 0
+    for day in days:
+        try:
+            mask |= 1 << DAY_NAMES.index(day.lower())
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid day: {day!r}") from None
+    return mask or ALL_DAYS_MASK
+
+class _LabeledIntEnum(IntEnum):
+    """IntEnum whose lowercase member name is its API label"""
+
+    @property
+    def label(self):
+        return self.name.lower()
+
+    @classmethod
+    def choices(cls):
+        """(code, label) pairs for a MongoEngine choices argument"""
+        return tuple((int(member), member.label) for member in cls)
+
+    @classmethod
+    def coerce(cls, value):
+        """Get a member from a member, int code or label; raise ValueError if invalid"""
+        if isinstance(value, str):
+            try:
+                return cls[value.upper()]
+            except KeyError:
+                raise ValueError(f"Invalid {cls.__name__}: {value!r}") from None
+        return cls(value)
+
+class LogStatus(_LabeledIntEnum):
+    """Medication log status, stored as an int"""
+    TAKEN = 0
+    MISSED = 1
+    DELAYED = 2
+
+class ProcessingStatus(_LabeledIntEnum):
+    """Prescription upload processing status, stored as an int"""
+    PENDING = 0
+    PROCESSING = 1
+    COMPLETED = 2
+    FAILED = 3
+
+def _build_columns(*names, ids=(), optional_ids=(), datetimes=(), sources=None, converters=None):
+    """Build the (key, source field, converter) spec shared by to_dict and the raw serializers"""
+    sources = sources or {}
+    converters = converters or {}
+    return tuple(
+        (
+            name,
+            sources.get(name, name),
+            converters[name] if name in converters else
+            str if name in ids else
+            _str_id if name in optional_ids else
+            _isoformat if name in datetimes else None
+        )
+        for name in names
+    )
+
+def _build_to_dict(columns):
+    """Build a to_dict method that loads all fields with a single attrgetter call"""
+    getter = operator.attrgetter(*(source for _, source, _ in columns))
+    pairs = tuple((name, convert) for name, _, convert in columns)
+
+    def to_dict(self):
+        return {
+            name: convert(value) if convert else value
+            for (name, convert), value in zip(pairs, getter(self))
+        }
+
+    return to_dict
+
+def _build_from_raw(doc_cls):
+    """Build a serializer for raw pymongo dicts from doc_cls's to_dict columns"""
+    keys = []
+    for name, source, convert in doc_cls._dict_columns:
+        field = doc_cls._fields[source]
+        default = None if callable(field.default) else field.default
+        keys.append((name, field.db_field, default, convert))
+    keys = tuple(keys)
+
+    def from_raw(raw):
+        get = raw.get
+        return {
+            name: convert(get(key, default)) if convert else get(key, default)
+            for name, key, default, convert in keys
+        }
+
+    return from_raw
+
+# Fields whose raw BSON value is already the Python value. Matched by exact type:
+# subclasses such as DateField and ComplexDateTimeField convert in to_python.
+_DIRECT_FIELD_TYPES = frozenset((
+    fields.StringField, fields.IntField, fields.BooleanField,
+    fields.DateTimeField, fields.ObjectIdField
+))
+
+def build_loader(doc_cls):
+    """Generate a loader that builds doc_cls instances straight from raw BSON dicts
+    
+    Equivalent to doc_cls._from_son() for this module's flat schemas, but with one
+    specialized line per field instead of MongoEngine's generic to_python loop.
+    """
+    namespace = {
+        '_cls': doc_cls,
+        '_set': object.__setattr__,
+        '_SON': SON,
+        '_partial': functools.partial,
+        '_class_name': doc_cls._class_name
+    }
+    lines = [
+        'def _load(son):',
+        '    get = son.get',
+        '    obj = _cls.__new__(_cls)',
+        '    data = {}'
+    ]
+    for name, field in doc_cls._fields.items():
+        default = field.default
+        if isinstance(default, (list, dict)):
+            default = functools.partial(copy.deepcopy, default)
+        namespace[f'_f_{name}'] = field
+        namespace[f'_d_{name}'] = default
+        fallback = f'_d_{name}()' if callable(default) else f'_d_{name}'
+        value = 'v' if type(field) in _DIRECT_FIELD_TYPES else f'_f_{name}.to_python(v)'
+        lines.append(f'    v = get({field.db_field!r})')
+        lines.append(f'    data[{name!r}] = {fallback} if v is None else {value}')
+    lines += [
+        "    _set(obj, '_data', data)",
+        "    _set(obj, '_dynamic_fields', _SON())",
+        "    _set(obj, '_changed_fields', [])",
+        "    _set(obj, '_cls', _class_name)"
+    ]
+    # Fields that store a converted value in __set__ (e.g. ComplexDateTimeField
+    # keeps a string) get the same pass through __set__ as in __init__
+    setters = [
+        name for name, field in doc_cls._fields.items()
+        if type(field).__set__ is not fields.BaseField.__set__
+    ]
+    if setters:
+        lines.append("    _set(obj, '_initialised', False)")
+        lines += [f'    _f_{name}.__set__(obj, data[{name!r}])' for name in setters]
+    for name, field in doc_cls._fields.items():
+        if field.choices:
+            lines.append(
+                f"    _set(obj, 'get_{name}_display', "
+                f"_partial(obj._BaseDocument__get_field_display, field=_f_{name}))"
+            )
+    lines += [
+        "    _set(obj, '_initialised', True)",
+        "    _set(obj, '_created', False)",
+        '    return obj'
+    ]
+    exec('\n'.join(lines), namespace)
+    return namespace['_load']
+
 # MongoDB Document Models using MongoEngine
 
 class User(Document, UserMixin):
@@ -70,7 +321,7 @@ class User(Document, UserMixin):
     
     # Basic user information
     username = fields.StringField(required=True, unique=True, max_length=80)
-    email = fields.EmailField(required=True, unique=True, max_length=120)
+    email = fields.StringField(required=True, unique=True, max_length=120)  # Validated in set_email
     password_hash = fields.StringField(required=True, max_length=200)
     
     # Personal information
@@ -81,7 +332,7 @@ class User(Document, UserMixin):
     
     # Account status
     is_active = fields.BooleanField(default=True)
-    created_at = fields.DateTimeField(default=datetime.utcnow)
+    created_at = fields.DateTimeField(default=_utcnow)
     last_login = fields.DateTimeField()
     
     # MongoDB collection name
@@ -90,9 +341,21 @@ class User(Document, UserMixin):
         'indexes': ['username', 'email']
     }
     
+    def set_email(self, email):
+        """Validate and set email address"""
+        if not isinstance(email, str) or not _EMAIL_RE.fullmatch(email):
+            raise ValueError(f"Invalid email address: {email}")
+        self.email = email
+    
     def set_password(self, password):
         """Set password hash"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(
+            password, method=PASSWORD_HASH_METHOD, salt_length=PASSWORD_SALT_LENGTH
+        )
+    
+    async def set_password_async(self, password):
+        """Set password hash in a worker thread, off the event loop"""
+        await asyncio.to_thread(self.set_password, password)
     
     def check_password(self, password):
         """Check password against hash"""
@@ -102,20 +365,19 @@ class User(Document, UserMixin):
         """Return user ID as string for Flask-Login"""
         return str(self.id)
     
-    def to_dict(self):
-        """Convert user to dictionary"""
-        return {
-            'id': str(self.id),
-            'username': self.username,
-            'email': self.email,
-            'first_name': self.first_name,
-            'last_name': self.last_name,
-            'phone': self.phone,
-            'date_of_birth': self.date_of_birth.isoformat() if self.date_of_birth else None,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None
-        }
+    # Convert user to dictionary
+    _dict_columns = _build_columns(
+        'id', 'username', 'email', 'first_name', 'last_name', 'phone', 'date_of_birth',
+        'is_active', 'created_at', 'last_login',
+        ids=('id',),
+        datetimes=('date_of_birth', 'created_at', 'last_login')
+    )
+    to_dict = _build_to_dict(_dict_columns)
+
+# Key pattern of the covering index behind Medication.list_for_user
+MEDICATION_LIST_INDEX = [
+    ('user_id', 1), ('is_active', 1), ('name', 1), ('dosage', 1), ('frequency', 1), ('_id', 1)
+]
 
 class Medication(Document):
     """Medication model for MongoDB"""
@@ -132,13 +394,13 @@ class Medication(Document):
     duration = fields.StringField(max_length=100)
     
     # Dates
-    start_date = fields.DateTimeField(default=datetime.utcnow)
+    start_date = fields.DateTimeField(default=_utcnow)
     end_date = fields.DateTimeField()
     
     # Status
     is_active = fields.BooleanField(default=True)
-    created_at = fields.DateTimeField(default=datetime.utcnow)
-    updated_at = fields.DateTimeField(default=datetime.utcnow)
+    created_at = fields.DateTimeField(default=_utcnow)
+    updated_at = fields.DateTimeField(default=_utcnow)
     
     # Additional metadata
     source = fields.StringField(default='manual')  # 'manual', 'ocr', 'prescription'
@@ -147,117 +409,355 @@ class Medication(Document):
     # MongoDB collection name
     meta = {
         'collection': 'medications',
-        'indexes': ['user_id', 'user_username', 'name', 'is_active']
+        'indexes': [
+            # Covers list_for_user; its (user_id, is_active) prefix serves the other active-medication queries
+            ('user_id', 'is_active', 'name', 'dosage', 'frequency', 'id'),
+            ('user_id', 'name')
+        ]
     }
     
+    @classmethod
+    def list_for_user(cls, user_id):
+        """List a user's active medications (id, name, dosage, frequency) from the index alone"""
+        cursor = cls._get_collection().find(
+            {'user_id': user_id, 'is_active': True},
+            {'_id': 1, 'name': 1, 'dosage': 1, 'frequency': 1}
+        ).hint(MEDICATION_LIST_INDEX)
+        return [
+            {
+                'id': str(raw['_id']),
+                'name': raw.get('name'),
+                'dosage': raw.get('dosage'),
+                'frequency': raw.get('frequency')
+            }
+            for raw in cursor
+        ]
+    
     def save(self, *args, **kwargs):
-        """Override save to update timestamp"""
-        self.updated_at = datetime.utcnow()
+        """Override save to update timestamp when something changed"""
+        # Leaving updated_at alone on unchanged documents lets save() skip the write
+        if self._created or self._get_changed_fields():
+            self.updated_at = _utcnow()
         return super().save(*args, **kwargs)
     
-    def to_dict(self):
-        """Convert medication to dictionary"""
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'name': self.name,
-            'dosage': self.dosage,
-            'frequency': self.frequency,
-            'instructions': self.instructions,
-            'duration': self.duration,
-            'start_date': self.start_date.isoformat() if self.start_date else None,
-            'end_date': self.end_date.isoformat() if self.end_date else None,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'source': self.source,
-            'confidence_score': self.confidence_score
-        }
+    # Convert medication to dictionary
+    _dict_columns = _build_columns(
+        'id', 'user_id', 'name', 'dosage', 'frequency', 'instructions', 'duration',
+        'start_date', 'end_date', 'is_active', 'created_at', 'updated_at', 'source',
+        'confidence_score',
+        ids=('id', 'user_id'),
+        datetimes=('start_date', 'end_date', 'created_at', 'updated_at')
+    )
+    to_dict = _build_to_dict(_dict_columns)
+
+# Reminder fields that move next_due when changed
+_SCHEDULE_FIELDS = frozenset(('time_minutes', 'days_mask', 'is_active'))
 
 class Reminder(Document):
-    """Reminder model for MongoDB"""
+    """Reminder model for MongoDB
+    
+    The reminder time is stored as time_minutes and the days as days_mask.
+    Reminder(time="HH:MM", days_of_week=[...]) and the matching properties still
+    work, but queries must filter on time_minutes and days_mask.
+    """
     
     # References
     medication_id = fields.ObjectIdField(required=True)
     user_id = fields.ObjectIdField(required=True)
     
     # Reminder details
-    time = fields.StringField(required=True)  # Store as "HH:MM" format
-    days_of_week = fields.ListField(fields.StringField(), default=['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'])
+    time_minutes = fields.IntField(required=True, min_value=0, max_value=1439)  # Minutes since midnight
+    days_mask = fields.IntField(default=ALL_DAYS_MASK, min_value=0, max_value=ALL_DAYS_MASK)  # Monday = bit 0
     
     # Status
     is_active = fields.BooleanField(default=True)
     last_sent = fields.DateTimeField()
-    next_due = fields.DateTimeField()
+    next_due = fields.DateTimeField()  # Local time of the next firing, kept up to date by save()
     
     # Timestamps
-    created_at = fields.DateTimeField(default=datetime.utcnow)
-    updated_at = fields.DateTimeField(default=datetime.utcnow)
+    created_at = fields.DateTimeField(default=_utcnow)
+    updated_at = fields.DateTimeField(default=_utcnow)
     
     # MongoDB collection name
     meta = {
         'collection': 'reminders',
-        'indexes': ['user_id', 'medication_id', 'is_active', 'next_due']
+        'indexes': [
+            ('user_id', 'is_active', 'next_due'),
+            ('medication_id', 'is_active'),
+            ('is_active', 'time_minutes'),
+            # Only active reminders are indexed, so due_reminders reads a small min-ordered set.
+            # Named so it cannot clash with the plain next_due_1 index of earlier versions.
+            {'fields': ['next_due'], 'name': 'next_due_active', 'partialFilterExpression': {'is_active': True}}
+        ]
     }
     
+    def __init__(self, *args, **values):
+        """Accept time="HH:MM" and days_of_week=[...] in place of time_minutes and days_mask"""
+        if 'time' in values:
+            time_value = values.pop('time')
+            if time_value is not None:
+                values['time_minutes'] = parse_time_minutes(time_value)
+        if 'days_of_week' in values:
+            days = values.pop('days_of_week')
+            if days is not None:
+                values['days_mask'] = days_to_mask(days)
+        super().__init__(*args, **values)
+    
+    @property
+    def time(self):
+        """Reminder time in "HH:MM" format"""
+        return _format_minutes(self.time_minutes)
+    
+    @time.setter
+    def time(self, value):
+        self.time_minutes = parse_time_minutes(value)
+    
+    @property
+    def days_of_week(self):
+        """Reminder days as a list of day names"""
+        return _days_from_mask(self.days_mask)
+    
+    @days_of_week.setter
+    def days_of_week(self, days):
+        self.days_mask = days_to_mask(days)
+    
+    @classmethod
+    def due_reminders(cls, now=None, limit=100):
+        """Get active reminders whose next_due has passed, earliest first"""
+        # is_active must be in the filter for the partial next_due index to apply
+        cursor = cls._get_collection().find(
+            {'is_active': True, 'next_due': {'$lte': now or datetime.now()}}
+        ).sort('next_due', 1).limit(limit)
+        return [cls._fast_load(son) for son in cursor]
+    
+    def compute_next_due(self, after=None):
+        """Get the next local firing time after a datetime (default now), or None"""
+        return next_due_after(self.time_minutes, self.days_mask, after or datetime.now())
+    
+    def is_due_on(self, weekday):
+        """Check if the reminder fires on a datetime.weekday() value"""
+        return bool(self.days_mask & (1 << weekday))
+    
     def save(self, *args, **kwargs):
-        """Override save to update timestamp"""
-        self.updated_at = datetime.utcnow()
+        """Override save to update timestamp and next_due when something changed"""
+        changed = self._get_changed_fields()
+        # Reschedule when the schedule changes; a sender sets next_due itself after firing
+        if self._created or self.next_due is None or _SCHEDULE_FIELDS.intersection(changed):
+            self.next_due = self.compute_next_due()
+        # Leaving updated_at alone on unchanged documents lets save() skip the write
+        if self._created or changed:
+            self.updated_at = _utcnow()
         return super().save(*args, **kwargs)
     
-    def to_dict(self):
-        """Convert reminder to dictionary"""
-        return {
-            'id': str(self.id),
-            'medication_id': str(self.medication_id),
-            'user_id': str(self.user_id),
-            'time': self.time,
-            'days_of_week': self.days_of_week,
-            'is_active': self.is_active,
-            'last_sent': self.last_sent.isoformat() if self.last_sent else None,
-            'next_due': self.next_due.isoformat() if self.next_due else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    # Convert reminder to dictionary
+    _dict_columns = _build_columns(
+        'id', 'medication_id', 'user_id', 'time', 'days_of_week', 'is_active',
+        'last_sent', 'next_due', 'created_at', 'updated_at',
+        ids=('id', 'medication_id', 'user_id'),
+        datetimes=('last_sent', 'next_due', 'created_at', 'updated_at'),
+        sources={'time': 'time_minutes', 'days_of_week': 'days_mask'},
+        converters={'time': _format_minutes, 'days_of_week': _days_from_mask}
+    )
+    to_dict = _build_to_dict(_dict_columns)
+
+# Month collections whose indexes were already created by this process
+_indexed_log_collections = set()
+
+class _MonthPartitionedObjects:
+    """Stands in for Document.objects on a document stored in month collections"""
+    
+    def __get__(self, instance, owner):
+        raise OperationError(
+            f"{owner.__name__} is stored in month collections; "
+            "use find_range() or list_fast() instead of objects"
+        )
 
 class MedicationLog(Document):
-    """Medication log model for MongoDB"""
+    """Medication log model for MongoDB
+    
+    Logs live in one collection per month (see month_collection). save, delete,
+    reload, update and modify route to it. MedicationLog.objects would query the
+    legacy base collection, so it raises; read through find_range or list_fast.
+    """
+    
+    objects = _MonthPartitionedObjects()
     
     # References
     user_id = fields.ObjectIdField(required=True)
     medication_id = fields.ObjectIdField(required=True)
     
     # Log details
-    taken_at = fields.DateTimeField(default=datetime.utcnow)
+    taken_at = fields.DateTimeField(default=_utcnow)
     dosage_taken = fields.StringField(max_length=50)
     notes = fields.StringField(max_length=500)
     
     # Status
-    status = fields.StringField(choices=['taken', 'missed', 'delayed'], default='taken')
+    status = fields.IntField(choices=LogStatus.choices(), default=LogStatus.TAKEN)
     reminder_id = fields.ObjectIdField()  # Reference to reminder that triggered this
     
     # Timestamps
-    created_at = fields.DateTimeField(default=datetime.utcnow)
+    created_at = fields.DateTimeField(default=_utcnow)
     
-    # MongoDB collection name
+    # Base collection name; logs are stored in one collection per month
+    # named "<base>_YYYYMM" (see month_collection)
     meta = {
         'collection': 'medication_logs',
-        'indexes': ['user_id', 'medication_id', 'taken_at', 'status']
+        'indexes': [('user_id', 'medication_id', '-taken_at'), ('user_id', '-taken_at', 'status')]
     }
     
-    def to_dict(self):
-        """Convert log to dictionary"""
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'medication_id': str(self.medication_id),
-            'taken_at': self.taken_at.isoformat() if self.taken_at else None,
-            'dosage_taken': self.dosage_taken,
-            'notes': self.notes,
-            'status': self.status,
-            'reminder_id': str(self.reminder_id) if self.reminder_id else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    @classmethod
+    def collection_name_for(cls, when):
+        """Get the month collection name for a datetime"""
+        return f"{cls._meta['collection']}_{when:%Y%m}"
+    
+    @classmethod
+    def month_collection(cls, when):
+        """Get the month collection for a datetime, creating its indexes on first use"""
+        name = cls.collection_name_for(when)
+        collection = cls._get_db()[name]
+        if name not in _indexed_log_collections:
+            for spec in cls._meta['index_specs']:
+                options = {key: value for key, value in spec.items() if key != 'fields'}
+                collection.create_index(spec['fields'], **options)
+            _indexed_log_collections.add(name)
+        return collection
+    
+    @classmethod
+    def month_collections(cls):
+        """Get all existing month collections"""
+        db = cls._get_db()
+        prefix = f"{cls._meta['collection']}_"
+        return [db[name] for name in sorted(db.list_collection_names()) if name.startswith(prefix)]
+    
+    @classmethod
+    def find_range(cls, start, end, **filters):
+        """Get raw logs with start <= taken_at < end, newest first, reading only the months in range"""
+        query = dict(filters, taken_at={'$gte': start, '$lt': end})
+        db = cls._get_db()
+        year, month = end.year, end.month
+        logs = []
+        while (year, month) >= (start.year, start.month):
+            name = cls.collection_name_for(datetime(year, month, 1))
+            logs.extend(db[name].find(query).sort('taken_at', -1))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return logs
+    
+    @classmethod
+    def drop_month(cls, when):
+        """Drop all logs for the month containing a datetime"""
+        name = cls.collection_name_for(when)
+        cls._get_db().drop_collection(name)
+        _indexed_log_collections.discard(name)
+    
+    # Name of the month collection this log was last read from or written to
+    _log_collection = None
+    
+    def _locate(self):
+        """Get the month collection holding this log, or None"""
+        db = self._get_db()
+        if self._log_collection:
+            return db[self._log_collection]
+        candidates = [db[self.collection_name_for(self.taken_at)]] if self.taken_at else []
+        candidates += self.month_collections()
+        for collection in candidates:
+            if collection.find_one({'_id': self.pk}, {'_id': 1}):
+                return collection
+        return None
+    
+    def save(self, validate=True, clean=True, write_concern=None, signal_kwargs=None):
+        """Override save to write into the month collection for taken_at"""
+        signal_kwargs = signal_kwargs or {}
+        signals.pre_save.send(self.__class__, document=self, **signal_kwargs)
+        if validate:
+            self.validate(clean=clean)
+        if self.taken_at is None:
+            self.taken_at = _utcnow()
+        collection = self.month_collection(self.taken_at)
+        if write_concern:
+            collection = collection.with_options(write_concern=WriteConcern(**write_concern))
+        created = self._created or self.pk is None
+        signals.pre_save_post_validation.send(
+            self.__class__, document=self, created=created, **signal_kwargs
+        )
+        son = self.to_mongo()
+        if self.pk is None:
+            self.pk = collection.insert_one(son).inserted_id
+        else:
+            collection.replace_one({'_id': self.pk}, son, upsert=True)
+            # Remove the copy left behind when taken_at moved to another month
+            if self._log_collection is None:
+                stale = [c for c in self.month_collections() if c.name != collection.name]
+            elif self._log_collection != collection.name:
+                stale = [self._get_db()[self._log_collection]]
+            else:
+                stale = []
+            for old_collection in stale:
+                old_collection.delete_one({'_id': self.pk})
+        self._log_collection = collection.name
+        self._clear_changed_fields()
+        self._created = False
+        signals.post_save.send(self.__class__, document=self, created=created, **signal_kwargs)
+        return self
+    
+    def delete(self, signal_kwargs=None, **write_concern):
+        """Override delete to remove the log from its month collection"""
+        signal_kwargs = signal_kwargs or {}
+        signals.pre_delete.send(self.__class__, document=self, **signal_kwargs)
+        collection = self._locate()
+        if collection is not None:
+            if write_concern:
+                collection = collection.with_options(write_concern=WriteConcern(**write_concern))
+            collection.delete_one({'_id': self.pk})
+        self._log_collection = None
+        signals.post_delete.send(self.__class__, document=self, **signal_kwargs)
+    
+    def reload(self, *fields, **kwargs):
+        """Override reload to read the log back from its month collection"""
+        collection = self._locate() if self.pk is not None else None
+        son = collection.find_one({'_id': self.pk}) if collection is not None else None
+        if son is None:
+            raise self.DoesNotExist("Document does not exist")
+        fresh = self._from_son(son)
+        for name in fields or self._fields_ordered:
+            self._data[name] = fresh._data.get(name)
+        self._changed_fields = [f for f in self._changed_fields if f not in fields] if fields else []
+        self._log_collection = collection.name
+        return self
+    
+    @property
+    def _qs(self):
+        """QuerySet over this log's month collection, used by the inherited update and modify"""
+        collection = self._locate() if self.pk is not None else None
+        if collection is None:
+            collection = self.month_collection(self.taken_at or _utcnow())
+        return QuerySet(self.__class__, collection)
+    
+    @staticmethod
+    def _check_month_kept(update):
+        """Reject atomic updates to taken_at, which would leave the log in the wrong month"""
+        if any('taken_at' in key.split('__') for key in update):
+            raise OperationError("Change taken_at with save(), which moves the log to its new month")
+    
+    def update(self, **kwargs):
+        """Override update to run in the month collection"""
+        self._check_month_kept(kwargs)
+        return super().update(**kwargs)
+    
+    def modify(self, query=None, **update):
+        """Override modify to run in the month collection"""
+        self._check_month_kept(update)
+        return super().modify(query, **update)
+    
+    # Convert log to dictionary
+    _dict_columns = _build_columns(
+        'id', 'user_id', 'medication_id', 'taken_at', 'dosage_taken', 'notes', 'status',
+        'reminder_id', 'created_at',
+        ids=('id', 'user_id', 'medication_id'),
+        optional_ids=('reminder_id',),
+        datetimes=('taken_at', 'created_at'),
+        converters={'status': dict(LogStatus.choices()).get}
+    )
+    to_dict = _build_to_dict(_dict_columns)
 
 class PrescriptionUpload(Document):
     """Prescription upload model for MongoDB"""
@@ -282,41 +782,296 @@ class PrescriptionUpload(Document):
     medications_added = fields.IntField(default=0)
     
     # Status
-    processing_status = fields.StringField(choices=['pending', 'processing', 'completed', 'failed'], default='pending')
+    processing_status = fields.IntField(
+        choices=ProcessingStatus.choices(), default=ProcessingStatus.PENDING
+    )
     error_message = fields.StringField()
     
     # Timestamps
-    uploaded_at = fields.DateTimeField(default=datetime.utcnow)
+    uploaded_at = fields.DateTimeField(default=_utcnow)
     processed_at = fields.DateTimeField()
     
     # MongoDB collection name
     meta = {
         'collection': 'prescription_uploads',
-        'indexes': ['user_id', 'uploaded_at', 'processing_status']
+        'indexes': [('user_id', '-uploaded_at'), ('user_id', 'processing_status')]
     }
     
-    def to_dict(self):
-        """Convert upload to dictionary"""
-        return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
-            'filename': self.filename,
-            'original_filename': self.original_filename,
-            'file_size': self.file_size,
-            'mime_type': self.mime_type,
-            'extracted_text': self.extracted_text,
-            'ocr_confidence': self.ocr_confidence,
-            'processing_time': self.processing_time,
-            'medications_found': self.medications_found,
-            'medications_added': self.medications_added,
-            'processing_status': self.processing_status,
-            'error_message': self.error_message,
-            'uploaded_at': self.uploaded_at.isoformat() if self.uploaded_at else None,
-            'processed_at': self.processed_at.isoformat() if self.processed_at else None
-        }
+    @classmethod
+    def bulk_advance(cls, updates):
+        """Set processing_status for a list of (ObjectId, status) pairs in one round-trip
+
+        Statuses may be ProcessingStatus members, int codes or labels ('completed');
+        every status is validated before anything is written.
+        """
+        if not updates:
+            return None
+        requests = [
+            (oid, int(ProcessingStatus.coerce(status))) for oid, status in updates
+        ]
+        now = _utcnow()
+        return cls._get_collection().bulk_write(
+            [
+                UpdateOne({'_id': oid}, {'$set': {'processing_status': status, 'processed_at': now}})
+                for oid, status in requests
+            ],
+            ordered=False
+        )
+    
+    # Convert upload to dictionary
+    _dict_columns = _build_columns(
+        'id', 'user_id', 'filename', 'original_filename', 'file_size', 'mime_type',
+        'extracted_text', 'ocr_confidence', 'processing_time', 'medications_found',
+        'medications_added', 'processing_status', 'error_message', 'uploaded_at',
+        'processed_at',
+        ids=('id', 'user_id'),
+        datetimes=('uploaded_at', 'processed_at'),
+        converters={'processing_status': dict(ProcessingStatus.choices()).get}
+    )
+    to_dict = _build_to_dict(_dict_columns)
+
+# Generated per-class loaders, used by list_fast
+for _doc_cls in (User, Medication, Reminder, MedicationLog, PrescriptionUpload):
+    _doc_cls._fast_load = staticmethod(build_loader(_doc_cls))
+
+# Raw document serializers
+# These consume the plain dicts returned by QuerySet.as_pymongo() so that
+# JSON-only callers can skip MongoEngine document instantiation entirely.
+# They share each class's _dict_columns with to_dict.
+
+user_dict_from_raw = _build_from_raw(User)
+medication_dict_from_raw = _build_from_raw(Medication)
+reminder_dict_from_raw = _build_from_raw(Reminder)
+medication_log_dict_from_raw = _build_from_raw(MedicationLog)
+prescription_upload_dict_from_raw = _build_from_raw(PrescriptionUpload)
 
 # Utility functions for MongoDB operations
 
+def no_deref(func):
+    """Decorator that disables dereferencing for read queries
+    
+    Currently a no-op: no_dereference only toggles ReferenceField,
+    GenericReferenceField and ComplexBaseField, and User and Medication have
+    none. It also flips class-level field state, so it is not thread-safe.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with no_dereference(User), no_dereference(Medication):
+            return func(*args, **kwargs)
+    return wrapper
+
+@no_deref
+def get_user_medications(user_id, active_only=True):
+    """Get a user's medications, newest first"""
+    filters = {'user_id': user_id}
+    if active_only:
+        filters['is_active'] = True
+    return list(Medication.objects(**filters).order_by('-created_at'))
+
+def query_as_dicts(model, **filters):
+    """Run a query and return raw pymongo dicts, skipping document instantiation"""
+    return list(model.objects(**filters).as_pymongo())
+
+def list_fast(doc_cls, **filters):
+    """Load documents matching raw filters with the class's generated loader
+
+    MedicationLog is read from its month collections, and each log remembers
+    the collection it came from so save/delete/reload stay in that month.
+    """
+    load = doc_cls._fast_load
+    if doc_cls is MedicationLog:
+        logs = []
+        for collection in MedicationLog.month_collections():
+            for son in collection.find(filters):
+                log = load(son)
+                log._log_collection = collection.name
+                logs.append(log)
+        return logs
+    return [load(son) for son in doc_cls._get_collection().find(filters)]
+
+def get_user_fast(user_id):
+    """Load a user by id with the generated loader, or None"""
+    son = User._get_collection().find_one({'_id': ObjectId(user_id)})
+    return User._fast_load(son) if son else None
+
+def user_exists(username):
+    """Check if a username is taken without loading the user document"""
+    return User._get_collection().count_documents({'username': username}, limit=1) > 0
+
+def email_exists(email):
+    """Check if an email is registered without loading the user document"""
+    return User._get_collection().count_documents({'email': email}, limit=1) > 0
+
+# Single-field indexes created by earlier versions, replaced by the compound indexes in meta
+_LEGACY_INDEXES = {
+    Medication: ('user_id_1', 'user_username_1', 'name_1', 'is_active_1'),
+    Reminder: ('user_id_1', 'medication_id_1', 'is_active_1', 'next_due_1'),
+    MedicationLog: ('user_id_1', 'medication_id_1', 'taken_at_1', 'status_1'),
+    PrescriptionUpload: ('user_id_1', 'uploaded_at_1', 'processing_status_1')
+}
+
+def drop_legacy_indexes():
+    """Drop single-field indexes replaced by compound ones; safe to run repeatedly
+    
+    Must run before the models are first used: _get_collection() creates the
+    indexes in meta, which fails when an old index has the same name.
+    """
+    try:
+        dropped = 0
+        for doc_cls, names in _LEGACY_INDEXES.items():
+            # Raw collection, so MongoEngine does not create indexes first
+            collection = doc_cls._get_db()[doc_cls._get_collection_name()]
+            existing = collection.index_information()
+            for name in names:
+                if name in existing:
+                    collection.drop_index(name)
+                    dropped += 1
+        if dropped:
+            logger.info("✅ Dropped %s legacy single-field indexes", dropped)
+        return True
+    except Exception as e:
+        logger.error("❌ Error dropping legacy indexes: %s", e)
+        return False
+
+# Legacy reminder times the old string parser accepted, e.g. "09:30" or "9:30"
+_LEGACY_TIME_PATTERN = r'^\s*([01]?[0-9]|2[0-3])\s*:\s*[0-5]?[0-9]\s*$'
+
+def migrate_reminder_times():
+    """Convert legacy "HH:MM" reminder times to time_minutes"""
+    try:
+        collection = Reminder._get_collection()
+        result = collection.update_many(
+            {'time': {'$type': 'string', '$regex': _LEGACY_TIME_PATTERN}},
+            [
+                {'$set': {'time_minutes': {'$let': {
+                    'vars': {'parts': {'$split': ['$time', ':']}},
+                    'in': {'$add': [
+                        {'$multiply': [{'$toInt': {'$trim': {'input': {'$arrayElemAt': ['$$parts', 0]}}}}, 60]},
+                        {'$toInt': {'$trim': {'input': {'$arrayElemAt': ['$$parts', 1]}}}}
+                    ]}
+                }}}},
+                {'$unset': 'time'}
+            ]
+        )
+        if result.modified_count:
+            logger.info("✅ Migrated %s reminder times to minutes", result.modified_count)
+        unparsed = collection.count_documents({'time': {'$exists': True}})
+        if unparsed:
+            logger.error("❌ %s reminders have unparseable times and will not fire", unparsed)
+            return False
+        return True
+    except Exception as e:
+        logger.error("❌ Error migrating reminder times: %s", e)
+        return False
+
+def migrate_reminder_days():
+    """Convert legacy days_of_week name lists to days_mask
+    
+    Duplicate and unknown day names are ignored. A list with no known days
+    becomes ALL_DAYS_MASK, since the old reminder loop ignored days entirely.
+    """
+    try:
+        # Each known day contributes its bit once, however often it is listed
+        mask = {'$sum': {'$map': {
+            'input': [[name, 1 << bit] for bit, name in enumerate(DAY_NAMES)],
+            'in': {'$cond': [
+                {'$in': [{'$arrayElemAt': ['$$this', 0]}, '$$days']},
+                {'$arrayElemAt': ['$$this', 1]},
+                0
+            ]}
+        }}}
+        result = Reminder._get_collection().update_many(
+            {'days_of_week': {'$type': 'array'}},
+            [
+                {'$set': {'days_mask': {'$let': {
+                    'vars': {'days': {'$map': {'input': '$days_of_week', 'in': {'$toLower': '$$this'}}}},
+                    'in': {'$let': {
+                        'vars': {'mask': mask},
+                        'in': {'$cond': [{'$eq': ['$$mask', 0]}, ALL_DAYS_MASK, '$$mask']}
+                    }}
+                }}}},
+                {'$unset': 'days_of_week'}
+            ]
+        )
+        if result.modified_count:
+            logger.info("✅ Migrated %s reminder day lists to bitmasks", result.modified_count)
+        return True
+    except Exception as e:
+        logger.error("❌ Error migrating reminder days: %s", e)
+        return False
+
+def migrate_next_due(batch_size=1000):
+    """Set next_due on active reminders that have none, so due_reminders finds them"""
+    try:
+        collection = Reminder._get_collection()
+        now = datetime.now()
+        cursor = collection.find(
+            {'is_active': True, 'next_due': None, 'time_minutes': {'$type': 'number'}},
+            {'time_minutes': 1, 'days_mask': 1}
+        )
+        requests = []
+        scheduled = 0
+        for son in cursor:
+            next_due = next_due_after(son['time_minutes'], son.get('days_mask', ALL_DAYS_MASK), now)
+            requests.append(UpdateOne({'_id': son['_id']}, {'$set': {'next_due': next_due}}))
+            if len(requests) == batch_size:
+                scheduled += collection.bulk_write(requests, ordered=False).modified_count
+                requests = []
+        if requests:
+            scheduled += collection.bulk_write(requests, ordered=False).modified_count
+        if scheduled:
+            logger.info("✅ Scheduled next_due for %s reminders", scheduled)
+        return True
+    except Exception as e:
+        logger.error("❌ Error scheduling reminders: %s", e)
+        return False
+
+def migrate_medication_logs(batch_size=1000):
+    """Move logs from the legacy base collection into month collections"""
+    try:
+        base = MedicationLog._get_collection()
+        moved = 0
+        while True:
+            batch = list(base.find().limit(batch_size))
+            if not batch:
+                break
+            by_month = {}
+            for son in batch:
+                son.setdefault('taken_at', _utcnow())
+                by_month.setdefault(MedicationLog.collection_name_for(son['taken_at']), []).append(son)
+            for docs in by_month.values():
+                try:
+                    MedicationLog.month_collection(docs[0]['taken_at']).insert_many(docs, ordered=False)
+                except BulkWriteError as e:
+                    # Logs copied by an earlier interrupted run are already there
+                    if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                        raise
+            base.delete_many({'_id': {'$in': [son['_id'] for son in batch]}})
+            moved += len(batch)
+        if moved:
+            logger.info("✅ Moved %s medication logs into month collections", moved)
+        return True
+    except Exception as e:
+        logger.error("❌ Error moving medication logs: %s", e)
+        return False
+
+def migrate_status_codes():
+    """Convert legacy string statuses on logs and uploads to enum ints"""
+    try:
+        targets = [(c, 'status', LogStatus) for c in MedicationLog.month_collections()]
+        targets.append((PrescriptionUpload._get_collection(), 'processing_status', ProcessingStatus))
+        migrated = 0
+        for collection, field, enum in targets:
+            for status in enum:
+                result = collection.update_many({field: status.label}, {'$set': {field: int(status)}})
+                migrated += result.modified_count
+        if migrated:
+            logger.info("✅ Migrated %s string statuses to enum codes", migrated)
+        return True
+    except Exception as e:
+        logger.error("❌ Error migrating status codes: %s", e)
+        return False
+
 def create_default_users():
     """Create default users in MongoDB"""
     try:
@@ -337,43 +1092,65 @@ def create_default_users():
             }
         ]
         
-        created_count = 0
-        for user_data in default_users:
-            # Check if user already exists
-            existing_user = User.objects(username=user_data['username']).first()
-            if not existing_user:
-                user = User(
-                    username=user_data['username'],
-                    email=user_data['email'],
-                    first_name=user_data['first_name'],
-                    last_name=user_data['last_name'],
-                    is_active=True
-                )
-                user.set_password(user_data['password'])
-                user.save()
-                created_count += 1
-                print(f"✅ Created MongoDB user: {user_data['username']}")
+        # Check which users already exist with a single query
+        existing = set(
+            doc['username'] for doc in User._get_collection().find(
+                {'username': {'$in': [u['username'] for u in default_users]}},
+                {'_id': 0, 'username': 1}
+            )
+        )
+        missing = [u for u in default_users if u['username'] not in existing]
+        
+        if not missing:
+            logger.info("ℹ️ All default users already exist in MongoDB")
+            return True
         
-        if created_count == 0:
-            print("ℹ️ All default users already exist in MongoDB")
+        new_users = []
+        for user_data in missing:
+            user = User(
+                username=user_data['username'],
+                first_name=user_data['first_name'],
+                last_name=user_data['last_name'],
+                is_active=True
+            )
+            user.set_email(user_data['email'])
+            new_users.append(user)
+        
+        # scrypt releases the GIL, so threads hash passwords in parallel
+        workers = min(len(new_users), os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(User.set_password, new_users, [u['password'] for u in missing]))
+        
+        for user in new_users:
+            user.validate()
+        
+        # Insert all new users in one round-trip without re-fetching them
+        User.objects.insert(new_users, load_bulk=False)
+        for user in new_users:
+            logger.info("✅ Created MongoDB user: %s", user.username)
         
         return True
         
     except Exception as e:
-        print(f"❌ Error creating default users: {e}")
+        logger.error("❌ Error creating default users: %s", e)
         return False
 
+def _estimated_count(collection):
+    """Estimated document count using 'local' read concern"""
+    return collection.with_options(read_concern=ReadConcern('local')).estimated_document_count()
+
 def get_database_stats():
     """Get MongoDB database statistics"""
     try:
+        # estimated_document_count reads collection metadata instead of running a query
         stats = {
-            'users': User.objects.count(),
-            'medications': Medication.objects.count(),
-            'reminders': Reminder.objects.count(),
-            'medication_logs': MedicationLog.objects.count(),
-            'prescription_uploads': PrescriptionUpload.objects.count()
+            'users': _estimated_count(User._get_collection()),
+            'medications': _estimated_count(Medication._get_collection()),
+            'reminders': _estimated_count(Reminder._get_collection()),
+            'medication_logs': sum(_estimated_count(c) for c in MedicationLog.month_collections()),
+            'prescription_uploads': _estimated_count(PrescriptionUpload._get_collection())
         }
         return stats
     except Exception as e:
-        print(f"❌ Error getting database stats: {e}")
+        logger.error("❌ Error getting database stats: %s", e)
         return None
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Test script for the generated document loaders in mongodb_config
+Checks that _fast_load builds the same documents as MongoEngine's _from_son,
+that change tracking matches, and that fast-loaded documents save correctly.
+Runs against an in-memory mongomock database (pip install mongomock).
+"""
+
+from datetime import datetime
+
+import mongomock
+from bson import ObjectId
+from mongoengine import Document, connect, disconnect, fields
+
+from mongodb_config import (
+    User, Medication, Reminder, MedicationLog, PrescriptionUpload,
+    LogStatus, ProcessingStatus, list_fast, build_loader
+)
+
+TAKEN_AT = datetime(2024, 3, 15, 8, 30)
+
+# Raw documents with every field set
+FULL_SONS = {
+    User: {
+        '_id': ObjectId(), 'username': 'fastload', 'email': 'fastload@example.com',
+        'password_hash': 'hash', 'first_name': 'Fast', 'last_name': 'Load',
+        'phone': '555-0100', 'date_of_birth': datetime(1990, 1, 2),
+        'is_active': False, 'created_at': datetime(2024, 1, 1), 'last_login': datetime(2024, 2, 1)
+    },
+    Medication: {
+        '_id': ObjectId(), 'user_id': ObjectId(), 'user_username': 'fastload',
+        'name': 'Aspirin', 'dosage': '100mg', 'frequency': 'daily',
+        'instructions': 'With food', 'duration': '7 days',
+        'start_date': datetime(2024, 1, 1), 'end_date': datetime(2024, 1, 8),
+        'is_active': True, 'created_at': datetime(2024, 1, 1), 'updated_at': datetime(2024, 1, 2),
+        'source': 'ocr', 'confidence_score': 0.75
+    },
+    Reminder: {
+        '_id': ObjectId(), 'medication_id': ObjectId(), 'user_id': ObjectId(),
+        'time_minutes': 510, 'days_mask': 0b0010101, 'is_active': True,
+        'last_sent': datetime(2024, 1, 1, 8, 30), 'next_due': datetime(2024, 1, 3, 8, 30),
+        'created_at': datetime(2024, 1, 1), 'updated_at': datetime(2024, 1, 2)
+    },
+    MedicationLog: {
+        '_id': ObjectId(), 'user_id': ObjectId(), 'medication_id': ObjectId(),
+        'taken_at': TAKEN_AT, 'dosage_taken': '100mg', 'notes': 'Late',
+        'status': int(LogStatus.DELAYED), 'reminder_id': ObjectId(),
+        'created_at': TAKEN_AT
+    },
+    PrescriptionUpload: {
+        '_id': ObjectId(), 'user_id': ObjectId(), 'filename': 'rx.png',
+        'original_filename': 'scan.png', 'file_path': '/uploads/rx.png',
+        'file_size': 2048, 'mime_type': 'image/png', 'extracted_text': 'Aspirin 100mg',
+        'ocr_confidence': 0.9, 'processing_time': 1.5, 'medications_found': 2,
+        'medications_added': 1, 'processing_status': int(ProcessingStatus.COMPLETED),
+        'error_message': None, 'uploaded_at': datetime(2024, 1, 1), 'processed_at': datetime(2024, 1, 1, 0, 1)
+    }
+}
+
+# Field to change on each class, and its new value
+CHANGES = {
+    User: ('first_name', 'Changed'),
+    Medication: ('dosage', '200mg'),
+    Reminder: ('time_minutes', 540),
+    MedicationLog: ('status', int(LogStatus.MISSED)),
+    PrescriptionUpload: ('medications_added', 2)
+}
+
+class ConvertedFields(Document):
+    """Fields that subclass a direct field type but convert in to_python"""
+    day = fields.DateField()
+    stamp = fields.ComplexDateTimeField()
+    meta = {'collection': 'converted_fields'}
+
+def sparse_son(doc_cls):
+    """Raw document with only required fields and fields with callable defaults"""
+    full = FULL_SONS[doc_cls]
+    keep = {'_id'}
+    for field in doc_cls._fields.values():
+        if field.required or callable(field.default):
+            keep.add(field.db_field)
+    return {key: value for key, value in full.items() if key in keep}
+
+def collection_for(doc_cls):
+    """Collection the sample document of a class is stored in"""
+    if doc_cls is MedicationLog:
+        return MedicationLog.month_collection(TAKEN_AT)
+    return doc_cls._get_collection()
+
+def setup_module(module=None):
+    connect('medimorph_fast_loader', host='mongodb://localhost',
+            mongo_client_class=mongomock.MongoClient)
+
+def teardown_module(module=None):
+    disconnect()
+
+def test_fast_load_matches_from_son():
+    """Fast-loaded documents carry the same data and state as _from_son"""
+    for doc_cls, son in FULL_SONS.items():
+        for raw in (son, sparse_son(doc_cls)):
+            fast = doc_cls._fast_load(dict(raw))
+            slow = doc_cls._from_son(dict(raw))
+            assert fast._data == slow._data, doc_cls.__name__
+            assert fast._changed_fields == slow._changed_fields == [], doc_cls.__name__
+            assert fast._created is slow._created is False, doc_cls.__name__
+            assert fast.to_dict() == slow.to_dict(), doc_cls.__name__
+
+def test_field_subclasses_convert():
+    """Subclasses of direct field types still go through to_python"""
+    son = {'_id': ObjectId(), 'day': datetime(2024, 3, 15), 'stamp': '2024,03,15,08,30,00,000000'}
+    fast = build_loader(ConvertedFields)(dict(son))
+    slow = ConvertedFields._from_son(dict(son))
+    assert fast._data == slow._data
+    assert fast.stamp == datetime(2024, 3, 15, 8, 30)
+
+def test_choices_display():
+    """get_<field>_display returns the status label on fast-loaded documents"""
+    log = MedicationLog._fast_load(dict(FULL_SONS[MedicationLog]))
+    assert log.get_status_display() == 'delayed'
+    upload = PrescriptionUpload._fast_load(dict(FULL_SONS[PrescriptionUpload]))
+    assert upload.get_processing_status_display() == 'completed'
+
+def test_change_tracking_matches_from_son():
+    """Assigning a field marks the same changes as on a _from_son document"""
+    for doc_cls, (name, value) in CHANGES.items():
+        fast = doc_cls._fast_load(dict(FULL_SONS[doc_cls]))
+        slow = doc_cls._from_son(dict(FULL_SONS[doc_cls]))
+        for doc in (fast, slow):
+            setattr(doc, name, value)
+        assert fast._get_changed_fields() == slow._get_changed_fields() == [name], doc_cls.__name__
+
+        # Assigning the current value is not a change
+        fast = doc_cls._fast_load(dict(FULL_SONS[doc_cls]))
+        setattr(fast, name, FULL_SONS[doc_cls][name])
+        assert fast._get_changed_fields() == [], doc_cls.__name__
+
+def test_save_round_trip():
+    """Documents from list_fast save back to the collection they came from"""
+    for doc_cls, (name, value) in CHANGES.items():
+        son = FULL_SONS[doc_cls]
+        collection = collection_for(doc_cls)
+        collection.delete_many({})
+        collection.insert_one(dict(son))
+
+        [doc] = list_fast(doc_cls, _id=son['_id'])
+        setattr(doc, name, value)
+        doc.save()
+
+        saved = collection.find_one({'_id': son['_id']})
+        assert saved[doc_cls._fields[name].db_field] == value, doc_cls.__name__
+        assert collection.count_documents({}) == 1, doc_cls.__name__
+        assert doc._get_changed_fields() == [], doc_cls.__name__
+
+def test_list_fast_reads_log_months():
+    """list_fast(MedicationLog) reads every month collection, not the base collection"""
+    for collection in MedicationLog.month_collections():
+        collection.drop()
+    user_id = ObjectId()
+    march = dict(FULL_SONS[MedicationLog], _id=ObjectId(), user_id=user_id)
+    april = dict(march, _id=ObjectId(), taken_at=datetime(2024, 4, 1))
+    MedicationLog.month_collection(march['taken_at']).insert_one(march)
+    MedicationLog.month_collection(april['taken_at']).insert_one(april)
+
+    logs = list_fast(MedicationLog, user_id=user_id)
+    assert sorted(log.id for log in logs) == sorted([march['_id'], april['_id']])
+
+    # Each log stays in its own month when saved again
+    for log in logs:
+        log.notes = 'Updated'
+        log.save()
+    assert MedicationLog.month_collection(march['taken_at']).count_documents({}) == 1
+    assert MedicationLog.month_collection(april['taken_at']).count_documents({}) == 1
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing generated document loaders")
+    print("=" * 50)
+    tests = [
+        test_fast_load_matches_from_son,
+        test_field_subclasses_convert,
+        test_choices_display,
+        test_change_tracking_matches_from_son,
+        test_save_round_trip,
+        test_list_fast_reads_log_months
+    ]
+    setup_module()
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+                print(f"✅ {test.__name__}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {test.__name__}: {e}")
+    finally:
+        teardown_module()
+    print("=" * 50)
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)
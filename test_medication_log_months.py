@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Test script for the month-partitioned MedicationLog collections in mongodb_config
+Checks that save, delete, reload, update and modify keep each log in the month
+collection for its taken_at, that find_range reads the right months, and that
+migrate_medication_logs resumes after an interrupted run.
+Runs against an in-memory mongomock database (pip install mongomock).
+"""
+
+from datetime import datetime
+
+import mongomock
+from bson import ObjectId
+from mongoengine import connect, disconnect
+from mongoengine.errors import OperationError
+
+from mongodb_config import MedicationLog, LogStatus, migrate_medication_logs
+
+MARCH = datetime(2024, 3, 15, 8, 30)
+APRIL = datetime(2024, 4, 2, 9, 0)
+
+def setup_module(module=None):
+    connect('medimorph_log_months', host='mongodb://localhost',
+            mongo_client_class=mongomock.MongoClient)
+
+def teardown_module(module=None):
+    disconnect()
+
+def reset():
+    """Drop the base collection and every month collection"""
+    for collection in MedicationLog.month_collections():
+        collection.drop()
+    MedicationLog._get_collection().drop()
+
+def new_log(taken_at, **values):
+    """Save a log taken at a datetime and return it"""
+    values = dict({'user_id': ObjectId(), 'medication_id': ObjectId()}, **values)
+    return MedicationLog(taken_at=taken_at, **values).save()
+
+def month_count(when, **filters):
+    """Number of logs in the month collection for a datetime"""
+    return MedicationLog.month_collection(when).count_documents(filters)
+
+def test_save_moves_log_between_months():
+    """Changing taken_at moves the log and leaves no stale copy behind"""
+    reset()
+    log = new_log(MARCH)
+    assert month_count(MARCH) == 1
+
+    log.taken_at = APRIL
+    log.save()
+    assert month_count(MARCH) == 0
+    assert month_count(APRIL, _id=log.id) == 1
+
+    # A log loaded without knowing its collection still removes the old copy
+    son = MedicationLog.month_collection(APRIL).find_one({'_id': log.id})
+    unknown = MedicationLog._from_son(son)
+    unknown.taken_at = MARCH
+    unknown.save()
+    assert month_count(APRIL) == 0
+    assert month_count(MARCH, _id=log.id) == 1
+
+def test_delete_removes_from_month():
+    """delete() removes the log from its month collection"""
+    reset()
+    log = new_log(MARCH)
+    other = new_log(MARCH)
+    log.delete()
+    assert month_count(MARCH) == 1
+    assert month_count(MARCH, _id=other.id) == 1
+
+def test_reload_reads_month():
+    """reload() reads the stored log back from its month collection"""
+    reset()
+    log = new_log(MARCH, notes='Before')
+    MedicationLog.month_collection(MARCH).update_one({'_id': log.id}, {'$set': {'notes': 'After'}})
+    log.status = LogStatus.MISSED
+    log.reload('notes')
+    assert log.notes == 'After'
+    assert log._get_changed_fields() == ['status']
+    log.reload()
+    assert log.status == LogStatus.TAKEN
+    assert log._get_changed_fields() == []
+
+    log.delete()
+    try:
+        log.reload()
+        raise AssertionError("reload() of a deleted log did not raise")
+    except MedicationLog.DoesNotExist:
+        pass
+
+def test_update_and_modify_use_month():
+    """update() and modify() change the log in its month collection"""
+    reset()
+    log = new_log(MARCH)
+    assert log.update(set__notes='Updated') == 1
+    assert MedicationLog.month_collection(MARCH).find_one({'_id': log.id})['notes'] == 'Updated'
+
+    assert log.modify(set__status=int(LogStatus.DELAYED))
+    assert log.status == LogStatus.DELAYED and log.notes == 'Updated'
+    assert not log.modify({'status': int(LogStatus.TAKEN)}, set__notes='Skipped')
+
+    try:
+        log.update(set__taken_at=APRIL)
+        raise AssertionError("update() of taken_at did not raise")
+    except OperationError:
+        pass
+    assert month_count(MARCH, _id=log.id) == 1
+
+def test_objects_refused():
+    """MedicationLog.objects raises instead of reading the empty base collection"""
+    try:
+        MedicationLog.objects(status=int(LogStatus.TAKEN))
+        raise AssertionError("MedicationLog.objects did not raise")
+    except OperationError:
+        pass
+
+def test_find_range_across_year_boundary():
+    """find_range includes start, excludes end, and reads months across a year change"""
+    reset()
+    user_id = ObjectId()
+    times = [
+        datetime(2023, 11, 30, 23, 59),  # Before start
+        datetime(2023, 12, 1),           # At start
+        datetime(2023, 12, 31, 23, 59),
+        datetime(2024, 1, 1),
+        datetime(2024, 2, 1)             # At end
+    ]
+    for taken_at in times:
+        new_log(taken_at, user_id=user_id)
+    new_log(datetime(2024, 1, 15))  # Another user
+
+    logs = MedicationLog.find_range(datetime(2023, 12, 1), datetime(2024, 2, 1), user_id=user_id)
+    assert [log['taken_at'] for log in logs] == [times[3], times[2], times[1]]
+
+def test_migrate_medication_logs_resumes():
+    """migrate_medication_logs skips logs an interrupted run already copied"""
+    reset()
+    base = MedicationLog._get_collection()
+    sons = [
+        {'_id': ObjectId(), 'user_id': ObjectId(), 'medication_id': ObjectId(),
+         'taken_at': taken_at, 'status': int(LogStatus.TAKEN)}
+        for taken_at in (MARCH, MARCH, APRIL, APRIL, APRIL)
+    ]
+    base.insert_many([dict(son) for son in sons])
+    # An earlier run copied these two before it was interrupted
+    MedicationLog.month_collection(MARCH).insert_one(dict(sons[0]))
+    MedicationLog.month_collection(APRIL).insert_one(dict(sons[2]))
+
+    assert migrate_medication_logs(batch_size=2)
+    assert base.count_documents({}) == 0
+    assert month_count(MARCH) == 2
+    assert month_count(APRIL) == 3
+
+    # Running again is a no-op
+    assert migrate_medication_logs(batch_size=2)
+    assert month_count(MARCH) + month_count(APRIL) == 5
+
+def main():
+    """Run all tests"""
+    print("🧪 Testing month-partitioned medication logs")
+    print("=" * 50)
+    tests = [
+        test_save_moves_log_between_months,
+        test_delete_removes_from_month,
+        test_reload_reads_month,
+        test_update_and_modify_use_month,
+        test_objects_refused,
+        test_find_range_across_year_boundary,
+        test_migrate_medication_logs_resumes
+    ]
+    setup_module()
+    failed = 0
+    try:
+        for test in tests:
+            try:
+                test()
+                print(f"✅ {test.__name__}")
+            except Exception as e:
+                failed += 1
+                print(f"❌ {test.__name__}: {e}")
+    finally:
+        teardown_module()
+    print("=" * 50)
+    print(f"📊 {len(tests) - failed}/{len(tests)} tests passed")
+    return failed == 0
+
+if __name__ == '__main__':
+    raise SystemExit(0 if main() else 1)